@@ -0,0 +1,57 @@
+"""
+numba kernels for :mod:`cbc_population_distributions.hyperparams_io`.
+
+Kept in their own module so that numba is only imported when a posterior is
+large enough to need them; importing this module fails without numba.
+"""
+
+import numpy as np
+from numba import get_num_threads, njit, prange
+
+
+def argmax_sum(a, b) -> int:
+    """
+    Index of the first maximum of ``a + b``, without allocating the sum.
+
+    The arrays are split into one contiguous block per numba thread; every
+    thread keeps its own running maximum and the block maxima are reduced in
+    order. As with ``np.nanargmax``, NaN sums count as -inf, so they are
+    skipped, ties resolve to the lowest index and an all-NaN sum raises a
+    ValueError.
+    """
+    index = _argmax_sum_blocks(a, b, max(min(get_num_threads(), a.size), 1))
+    if index < 0:
+        raise ValueError("All-NaN slice encountered")
+    return int(index)
+
+
+# the thread count is an argument: reading it inside the kernel breaks caching
+@njit(parallel=True, cache=True)
+def _argmax_sum_blocks(a, b, n_blocks):
+    n = a.shape[0]
+    block_best = np.empty(n_blocks)
+    block_index = np.empty(n_blocks, dtype=np.int64)
+    block_valid = np.zeros(n_blocks, dtype=np.bool_)
+    for block in prange(n_blocks):
+        start = block * n // n_blocks
+        stop = (block + 1) * n // n_blocks
+        best = -np.inf
+        index = start
+        for i in range(start, stop):
+            value = a[i] + b[i]
+            if np.isnan(value):
+                continue
+            block_valid[block] = True
+            if value > best:
+                best = value
+                index = i
+        block_best[block] = best
+        block_index[block] = index
+
+    if not block_valid.any():
+        return -1
+    best_block = 0
+    for block in range(1, n_blocks):
+        if block_best[block] > block_best[best_block]:
+            best_block = block
+    return block_index[best_block]
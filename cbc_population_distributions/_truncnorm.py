@@ -0,0 +1,38 @@
+"""
+Normalisation of the truncated normal distributions shared by the mass and
+spin models.
+"""
+
+from operator import gt
+
+import numpy as np
+from gwpopulation.utils import apply_conditions, scs, xp
+
+
+@apply_conditions(dict(sigma=(gt, 0)))
+def log_truncnorm_norm(mu, sigma, low, high):
+    """
+    Log of the probability mass of N(mu, sigma) between scalar ``low`` and ``high``,
+    using the same tail-stable branches as ``gwpopulation.utils.truncnorm``.
+    The branch is picked with ``xp.select`` so that it can be traced by JAX.
+
+    As for ``truncnorm``, ``sigma`` is only checked when passed by keyword and
+    the backend is not JAX.
+    """
+    aa = xp.asarray((low - mu) / sigma)
+    bb = xp.asarray((high - mu) / sigma)
+    # every branch is evaluated, the unused ones may overflow
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        return xp.select(
+            [bb <= 0, aa > 0, bb > 0],
+            [
+                _logsubexp(scs.log_ndtr(bb), scs.log_ndtr(aa)),
+                _logsubexp(scs.log_ndtr(-aa), scs.log_ndtr(-bb)),
+                xp.log1p(-scs.ndtr(aa) - scs.ndtr(-bb)),
+            ],
+            xp.nan,
+        )
+
+
+def _logsubexp(log_p, log_q):
+    return log_p + xp.log1p(-xp.exp(log_q - log_p))
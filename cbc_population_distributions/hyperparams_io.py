@@ -0,0 +1,123 @@
+"""
+Reading of the population hyperparameters from bilby result files.
+
+- get_map_sample: MAP (or ML) sample of a bilby HDF5 result file, cached per file.
+- _get_map_sample: MAP (or ML) sample of an already loaded bilby result.
+
+"""
+
+import warnings
+from functools import lru_cache
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pandas as pd
+
+
+def get_map_sample(path, columns=None) -> pd.Series:
+    """
+    Return the MAP sample of a bilby HDF5 result file.
+
+    Bilby stores the posterior as one HDF5 dataset per column, so only the
+    log-likelihood, the log-prior and the requested columns are read. Results
+    are cached per file, so scripts run in the same process share one read.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the bilby result file (.hdf5).
+    columns : iterable of str, optional
+        Posterior columns to return, in addition to the log-likelihood and the
+        log-prior. Columns missing from the posterior are skipped. Default is
+        all posterior columns.
+
+    Returns
+    -------
+    pandas.Series
+        MAP sample if the prior is informative, else ML sample. A new copy is
+        returned on every call, so it can be modified freely.
+    """
+    path = Path(path).resolve()
+    if columns is not None:
+        columns = tuple(columns)
+    # the modification time is part of the key, so a rewritten file is re-read
+    return _cached_map_sample(path, path.stat().st_mtime_ns, columns).copy()
+
+
+def _get_map_sample(hyperparams) -> pd.Series:
+    """
+    Return MAP sample if prior is informative, else ML sample.
+    The returned row is a copy, it can be modified without touching the posterior.
+    """
+    return _map_sample(hyperparams.posterior).copy()
+
+
+def _map_sample(post) -> pd.Series:
+    """
+    MAP (or ML) row of a posterior DataFrame, see :func:`_get_map_sample`.
+    """
+    log_likelihood = post["log_likelihood"].to_numpy()
+    if "log_prior" in post.columns:
+        log_prior = post["log_prior"].to_numpy()
+        # a constant prior leaves the ranking unchanged; NaN is ignored as by
+        # nunique(), and an all-NaN prior (NaN > NaN) counts as constant
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            informative = np.nanmax(log_prior) > np.nanmin(log_prior)
+        if informative:
+            return post.iloc[_argmax_sum(log_likelihood, log_prior)]
+    # NaN rows are skipped, as by the pandas argmax of the original lookup
+    return post.iloc[int(np.nanargmax(log_likelihood))]
+
+
+@lru_cache(maxsize=4)
+def _cached_map_sample(path, mtime_ns, columns) -> pd.Series:
+    # bilby writes the posterior as a group holding one dataset per column
+    if not h5py.is_hdf5(path):
+        raise ValueError(f"Not an HDF5 file: {path}")
+    with h5py.File(path, "r") as f:
+        post = f.get("posterior")
+        if not isinstance(post, h5py.Group) or "log_likelihood" not in post:
+            raise ValueError(
+                f"{path} is not a bilby HDF5 result: expected a 'posterior' group "
+                "with one dataset per column, including 'log_likelihood'"
+            )
+        if columns is None:
+            keys = list(post)
+        else:
+            keys = ["log_likelihood", "log_prior", *columns]
+        posterior = pd.DataFrame({key: post[key][:] for key in keys if key in post})
+    return _map_sample(posterior)
+
+
+# Below this size NumPy's add + argmax is faster than the fused loop, and
+# importing numba would cost more than the whole scan.
+_FUSED_ARGMAX_MIN_SIZE = 5_000_000
+
+
+def _argmax_sum(a, b) -> int:
+    """
+    Index of the maximum of ``a + b``, with the semantics of ``np.nanargmax``
+    (first maximum, NaN skipped). Large arrays are scanned by a fused,
+    multi-threaded numba loop, when numba is installed, which does not
+    allocate the sum.
+    """
+    if a.size >= _FUSED_ARGMAX_MIN_SIZE:
+        kernel = _fused_argmax_sum()
+        if kernel is not None:
+            return int(kernel(a, b))
+    return int(np.nanargmax(a + b))
+
+
+@lru_cache(maxsize=None)
+def _fused_argmax_sum():
+    """
+    :func:`._argmax_kernels.argmax_sum`, or None without numba. numba is only
+    imported on first use, so that reading small posteriors stays light.
+    """
+    try:
+        from ._argmax_kernels import argmax_sum
+    except ImportError:
+        return None
+    return argmax_sum
@@ -2,7 +2,22 @@
 Implements both independent and mass-ratio paired versions of the 2D mass model, plus the single-mass model.
 """
 
-from gwpopulation.utils import truncnorm, xp
+import math
+
+import numpy as np
+from gwpopulation.utils import xp
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+from ._truncnorm import log_truncnorm_norm
+
+# fastmath without the no-NaN/no-inf assumptions: the filters rely on
+# exp(n * (log(a) - log(m))) overflowing to inf far beyond a cut-off (and at
+# m = 0, where log(m) is -inf), and on 1 / inf evaluating to zero.
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
 
 
 def power_law_dip_break_1d(
@@ -102,35 +117,43 @@ def power_law_dip_break_1d(
     n{3,4}: float
         Exponents to set the sharpness of the lower edge and upper edge of the upper mass gap, respectively (:math:`\eta_i`). 
         
-    """
+    .. note::
+        When ``numba`` is installed and ``mass`` is a NumPy array, the whole
+        expression is evaluated in a single fused, multi-threaded loop instead
+        of a chain of array operations.
 
-    gaussian_peak1 = truncnorm(mass, mu1, sig1, low=absolute_mmin, high=absolute_mmax)
-    gaussian_peak2 = truncnorm(mass, mu2, sig2, low=absolute_mmin, high=absolute_mmax)
-
-    condlist = [mass < NSmax, (mass >= NSmax) & (mass < BHmin), mass >= BHmin]
-    choicelist = [
-        mass**alpha_1,
-        (mass**alpha_dip) * (NSmax ** (alpha_1 - alpha_dip)),
-        (mass**alpha_2)
-        * (NSmax ** (alpha_1 - alpha_dip))
-        * (BHmin ** (alpha_dip - alpha_2)),
-    ]
-    plaw = xp.select(condlist, choicelist, default=0.0)
-
-    highpass_lower = 1 + (NSmin / mass) ** n0
-    notch_lower = 1.0 - A / ((1 + (NSmax / mass) ** n1) * (1 + (mass / BHmin) ** n2))
-    notch_upper = 1.0 - A2 / (
-        (1 + (UPPERmin / mass) ** n3) * (1 + (mass / UPPERmax) ** n4)
-    )
-    lowpass_upper = 1 + (mass / BHmax) ** n5
-
-    return (
-        (1 + mix1 * gaussian_peak1 + mix2 * gaussian_peak2)
-        * plaw
-        * notch_lower
-        * notch_upper
-        / highpass_lower
-        / lowpass_upper
+    """
+    log_norm1 = _log_peak_norm(mu1, sig1, absolute_mmin, absolute_mmax)
+    log_norm2 = _log_peak_norm(mu2, sig2, absolute_mmin, absolute_mmax)
+    return _power_law_dip_break_1d(
+        mass,
+        A,
+        A2,
+        NSmin,
+        NSmax,
+        BHmin,
+        BHmax,
+        UPPERmin,
+        UPPERmax,
+        n0,
+        n1,
+        n2,
+        n3,
+        n4,
+        n5,
+        alpha_1,
+        alpha_2,
+        alpha_dip,
+        mu1,
+        sig1,
+        mix1,
+        mu2,
+        sig2,
+        mix2,
+        absolute_mmin,
+        absolute_mmax,
+        log_norm1,
+        log_norm2,
     )
 
 
@@ -182,7 +205,11 @@ def matter_matters_primary_secondary_independent(
         Joint probability for each (mass_1, mass_2) pair.
 
     """
-    p_m1 = power_law_dip_break_1d(
+    log_norm1 = _log_peak_norm(mu1, sig1, absolute_mmin, absolute_mmax)
+    log_norm2 = _log_peak_norm(mu2, sig2, absolute_mmin, absolute_mmax)
+    support = _mass_support(dataset)
+
+    p_m1 = _power_law_dip_break_1d(
         dataset["mass_1"],
         A,
         A2,
@@ -209,9 +236,12 @@ def matter_matters_primary_secondary_independent(
         mix2,
         absolute_mmin,
         absolute_mmax,
+        log_norm1,
+        log_norm2,
+        support,
     )
 
-    p_m2 = power_law_dip_break_1d(
+    p_m2 = _power_law_dip_break_1d(
         dataset["mass_2"],
         A,
         A2,
@@ -238,12 +268,15 @@ def matter_matters_primary_secondary_independent(
         mix2,
         absolute_mmin,
         absolute_mmax,
+        log_norm1,
+        log_norm2,
+        support,
     )
 
     prob = _primary_secondary_general(dataset, p_m1, p_m2)
 
-    # get rid of areas where there are no injections
-    prob = xp.where((dataset["mass_1"] > 60) * (dataset["mass_2"] < 3), 0, prob)
+    # get rid of m1 < m2 and of areas where there are no injections
+    prob = xp.where(support, prob, 0)
     return prob
 
 
@@ -316,7 +349,11 @@ def matter_matters_pairing(
     changes at `mbreak`.
     """
 
-    p_m1 = power_law_dip_break_1d(
+    log_norm1 = _log_peak_norm(mu1, sig1, absolute_mmin, absolute_mmax)
+    log_norm2 = _log_peak_norm(mu2, sig2, absolute_mmin, absolute_mmax)
+    support = _mass_support(dataset)
+
+    p_m1 = _power_law_dip_break_1d(
         dataset["mass_1"],
         A,
         A2,
@@ -343,9 +380,12 @@ def matter_matters_pairing(
         mix2,
         absolute_mmin,
         absolute_mmax,
+        log_norm1,
+        log_norm2,
+        support,
     )
 
-    p_m2 = power_law_dip_break_1d(
+    p_m2 = _power_law_dip_break_1d(
         dataset["mass_2"],
         A,
         A2,
@@ -372,20 +412,289 @@ def matter_matters_pairing(
         mix2,
         absolute_mmin,
         absolute_mmax,
+        log_norm1,
+        log_norm2,
+        support,
     )
 
-    beta_pair = xp.where(dataset["mass_2"] < mbreak, beta_pair_1, beta_pair_2)
-
-    prob = _primary_secondary_plaw_pairing(dataset, p_m1, p_m2, beta_pair)
-    # get rid of areas where there are no injections
-    prob = xp.where((dataset["mass_1"] > 60) * (dataset["mass_2"] < 3), 0, prob)
+    prob = _primary_secondary_plaw_pairing(
+        dataset, p_m1, p_m2, mbreak, beta_pair_1, beta_pair_2
+    )
+    # get rid of m1 < m2 and of areas where there are no injections
+    prob = xp.where(support, prob, 0)
     return prob
 
 
 def _primary_secondary_general(dataset, p_m1, p_m2):
-    return p_m1 * p_m2 * (dataset["mass_1"] >= dataset["mass_2"]) * 2
+    # the m1 >= m2 support is applied by the callers, see _mass_support
+    return p_m1 * p_m2 * 2
+
+
+def _mass_support(dataset):
+    """
+    Boolean mask of the (mass_1, mass_2) pairs where the 2D models are non-zero:
+    mass_1 >= mass_2, excluding mass_1 > 60 with mass_2 < 3 where there are no
+    injections.
+    """
+    mass_1 = dataset["mass_1"]
+    mass_2 = dataset["mass_2"]
+    return (mass_1 >= mass_2) & ((mass_1 <= 60) | (mass_2 >= 3))
 
 
-def _primary_secondary_plaw_pairing(dataset, p_m1, p_m2, beta_pair):
+def _primary_secondary_plaw_pairing(
+    dataset, p_m1, p_m2, mbreak, beta_pair_1, beta_pair_2
+):
     q = dataset["mass_2"] / dataset["mass_1"]
+    beta_pair = xp.where(dataset["mass_2"] < mbreak, beta_pair_1, beta_pair_2)
     return _primary_secondary_general(dataset, p_m1, p_m2) * (q**beta_pair)
+
+
+def _power_law_dip_break_1d(
+    mass,
+    A,
+    A2,
+    NSmin,
+    NSmax,
+    BHmin,
+    BHmax,
+    UPPERmin,
+    UPPERmax,
+    n0,
+    n1,
+    n2,
+    n3,
+    n4,
+    n5,
+    alpha_1,
+    alpha_2,
+    alpha_dip,
+    mu1,
+    sig1,
+    mix1,
+    mu2,
+    sig2,
+    mix2,
+    absolute_mmin,
+    absolute_mmax,
+    log_norm1,
+    log_norm2,
+    support=None,
+):
+    """
+    :func:`power_law_dip_break_1d` with the normalisations of the two truncated
+    Gaussian peaks (``log_norm1``, ``log_norm2``, see :func:`_log_peak_norm`)
+    precomputed by the caller.
+
+    ``support`` is an optional boolean mask, with the shape of ``mass``, of the
+    elements whose value is needed. The fused kernel skips the other elements
+    and returns zero for them, the xp path evaluates every element.
+
+    The 2D models call this once for ``mass_1`` and once for ``mass_2``.
+    Evaluating both in one call on their concatenation was tried and is slower
+    for the array sizes drawn by the sampler, as the copy into the concatenated
+    array costs more than the saved per-call overhead.
+    """
+    if njit is not None and isinstance(mass, np.ndarray):
+        return _power_law_dip_break_1d_fused(
+            mass,
+            support,
+            A,
+            A2,
+            NSmin,
+            NSmax,
+            BHmin,
+            BHmax,
+            UPPERmin,
+            UPPERmax,
+            n0,
+            n1,
+            n2,
+            n3,
+            n4,
+            n5,
+            alpha_1,
+            alpha_2,
+            alpha_dip,
+            mu1,
+            sig1,
+            mix1,
+            mu2,
+            sig2,
+            mix2,
+            absolute_mmin,
+            absolute_mmax,
+            log_norm1,
+            log_norm2,
+        )
+
+    in_bounds = (mass >= absolute_mmin) & (mass <= absolute_mmax)
+    gaussian_peaks = in_bounds * (
+        mix1 * _trunc_gauss(mass, mu1, sig1, log_norm1)
+        + mix2 * _trunc_gauss(mass, mu2, sig2, log_norm2)
+    )
+
+    # All mass dependence below goes through log(mass): the broken power law is
+    # piecewise linear in it, and every (a / mass) ** n filter term is
+    # evaluated as exp(n * (log(a) - log(mass))), with the scalar log(a) taken
+    # once per call.
+    log_mass = xp.log(mass)
+    log_NSmin = xp.log(NSmin)
+    log_NSmax = xp.log(NSmax)
+    log_BHmin = xp.log(BHmin)
+    log_BHmax = xp.log(BHmax)
+    log_UPPERmin = xp.log(UPPERmin)
+    log_UPPERmax = xp.log(UPPERmax)
+
+    c_dip = (alpha_1 - alpha_dip) * log_NSmax
+    c_high = c_dip + (alpha_dip - alpha_2) * log_BHmin
+    below_NSmax = mass < NSmax
+    below_BHmin = mass < BHmin
+    slope = xp.where(below_NSmax, alpha_1, xp.where(below_BHmin, alpha_dip, alpha_2))
+    offset = xp.where(below_NSmax, 0.0, xp.where(below_BHmin, c_dip, c_high))
+    plaw = xp.exp(slope * log_mass + offset)
+
+    highpass_lower = 1 + xp.exp(n0 * (log_NSmin - log_mass))
+    notch_lower = 1.0 - A / (
+        (1 + xp.exp(n1 * (log_NSmax - log_mass)))
+        * (1 + xp.exp(n2 * (log_mass - log_BHmin)))
+    )
+    notch_upper = 1.0 - A2 / (
+        (1 + xp.exp(n3 * (log_UPPERmin - log_mass)))
+        * (1 + xp.exp(n4 * (log_mass - log_UPPERmax)))
+    )
+    lowpass_upper = 1 + xp.exp(n5 * (log_mass - log_BHmax))
+
+    return (
+        (1 + gaussian_peaks)
+        * plaw
+        * notch_lower
+        * notch_upper
+        / highpass_lower
+        / lowpass_upper
+    )
+
+
+def _log_peak_norm(mu, sigma, low, high):
+    """
+    Log normalisation of a Gaussian peak truncated to ``[low, high]``. It stays
+    in log space, so that peaks far outside the bounds remain finite.
+    """
+    return (
+        log_truncnorm_norm(mu, sigma=sigma, low=low, high=high)
+        + xp.log(sigma)
+        + np.log(2 * np.pi) / 2
+    )
+
+
+def _trunc_gauss(mass, mu, sigma, log_norm):
+    """
+    Truncated Gaussian peak, without the bounds, see :func:`_log_peak_norm`.
+    Overflows outside the bounds are clipped, as in ``truncnorm``, so that
+    masking them gives zero.
+    """
+    return xp.nan_to_num(xp.exp(-((mass - mu) ** 2) / (2 * sigma**2) - log_norm))
+
+
+def _power_law_dip_break_1d_fused(mass, support, *params):
+    """
+    Evaluate :func:`power_law_dip_break_1d` on a NumPy array with the fused
+    numba kernel. ``support`` and ``params`` follow the signature of
+    :func:`_power_law_dip_break_1d`.
+    """
+    if support is None or np.shape(support) != mass.shape:
+        support = np.ones(0, dtype=bool)
+    out = np.empty(mass.shape, dtype=np.result_type(mass.dtype, np.float32))
+    _pldb_kernel(
+        np.ascontiguousarray(mass).reshape(-1),
+        np.ascontiguousarray(support).reshape(-1),
+        out.reshape(-1),
+        *[float(param) for param in params],
+    )
+    return out
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _pldb_kernel(
+        mass,
+        support,
+        out,
+        A,
+        A2,
+        NSmin,
+        NSmax,
+        BHmin,
+        BHmax,
+        UPPERmin,
+        UPPERmax,
+        n0,
+        n1,
+        n2,
+        n3,
+        n4,
+        n5,
+        alpha_1,
+        alpha_2,
+        alpha_dip,
+        mu1,
+        sig1,
+        mix1,
+        mu2,
+        sig2,
+        mix2,
+        absolute_mmin,
+        absolute_mmax,
+        log_norm1,
+        log_norm2,
+    ):
+        log_NSmin = math.log(NSmin)
+        log_NSmax = math.log(NSmax)
+        log_BHmin = math.log(BHmin)
+        log_BHmax = math.log(BHmax)
+        log_UPPERmin = math.log(UPPERmin)
+        log_UPPERmax = math.log(UPPERmax)
+        c_dip = (alpha_1 - alpha_dip) * log_NSmax
+        c_high = c_dip + (alpha_dip - alpha_2) * log_BHmin
+        for i in prange(mass.shape[0]):
+            # an empty support means every element is needed
+            if support.size > 0 and not support[i]:
+                out[i] = 0.0
+                continue
+
+            m = mass[i]
+            # every (a / m) ** n below is rewritten as exp(n * (log(a) - log(m)))
+            lm = math.log(m)
+
+            # out of bounds, the peaks are zero and their exp may overflow
+            peaks = 1.0
+            if absolute_mmin <= m <= absolute_mmax:
+                peaks += mix1 * math.exp(-((m - mu1) ** 2) / (2 * sig1**2) - log_norm1)
+                peaks += mix2 * math.exp(-((m - mu2) ** 2) / (2 * sig2**2) - log_norm2)
+
+            if m < NSmax:
+                plaw = math.exp(alpha_1 * lm)
+            elif m < BHmin:
+                plaw = math.exp(alpha_dip * lm + c_dip)
+            else:
+                plaw = math.exp(alpha_2 * lm + c_high)
+
+            highpass_lower = 1 + math.exp(n0 * (log_NSmin - lm))
+            notch_lower = 1.0 - A / (
+                (1 + math.exp(n1 * (log_NSmax - lm)))
+                * (1 + math.exp(n2 * (lm - log_BHmin)))
+            )
+            notch_upper = 1.0 - A2 / (
+                (1 + math.exp(n3 * (log_UPPERmin - lm)))
+                * (1 + math.exp(n4 * (lm - log_UPPERmax)))
+            )
+            lowpass_upper = 1 + math.exp(n5 * (lm - log_BHmax))
+
+            out[i] = (
+                peaks
+                * plaw
+                * notch_lower
+                * notch_upper
+                / highpass_lower
+                / lowpass_upper
+            )
@@ -9,21 +9,32 @@ redshift evolution, the default population model of GWTC-4.
 
 The script extracts MAP hyperparameters from ``gwpopulation``-style result files and draws
 simulated CBC events under the GWTC-4 population model. Samples are generated in chunks for
-memory safety and saved in JSON and HDF5 formats.
+memory safety, streamed to a single HDF5 file and finally also saved in JSON format.
 """
 
 import argparse
 import logging
 from pathlib import Path
 
+import h5py
 import numpy as np
 import pandas as pd
-from astropy.table import Table
-from bilby.core.result import read_in_result
 from bilby.hyper.model import Model
 from gwpopulation.models.redshift import PowerLawRedshift
+from gwpopulation.utils import xp
 from tqdm import tqdm
 
+try:
+    import joblib
+    from joblib import Parallel, delayed
+except ImportError:
+    Parallel = None
+else:
+    # Parallel(return_as="generator") needs joblib >= 1.3
+    if tuple(int(v) for v in joblib.__version__.split(".")[:2]) < (1, 3):
+        Parallel = None
+
+from .hyperparams_io import get_map_sample
 from .mass import (
     matter_matters_pairing,
     matter_matters_primary_secondary_independent,
@@ -38,18 +49,6 @@ from .spin import (
 logger = logging.getLogger(__name__)
 
 
-def _get_map_sample(hyperparams) -> pd.Series:
-    """
-    Return MAP sample if prior is informative, else ML sample.
-    """
-    post = hyperparams.posterior.copy()
-    if "log_prior" in post and post["log_prior"].nunique() > 1:
-        score = post.log_likelihood + post.log_prior
-        return post.iloc[np.argmax(score)]
-    else:
-        return post.iloc[np.argmax(post.log_likelihood)]
-
-
 # ---------------- Drawing ----------------
 def sample_max_post(
     hyperparams_file: str,
@@ -60,6 +59,10 @@ def sample_max_post(
     absolute_mmax: float = 350.0,
     z_max: float = 2.3,
     pairing: bool = True,
+    emit_chunk_json: bool = False,
+    seed: int | None = None,
+    dtype: str = "float64",
+    n_jobs: int = 1,
 ) -> dict[str, str]:
     """
     Draw samples from MAP hyperparameters of the Broken
@@ -81,6 +84,16 @@ def sample_max_post(
         Maximum redshift for PowerLawRedshift.
     pairing : bool
         If True, use the pairing mass model; if False, independent primary/secondary.
+    emit_chunk_json : bool
+        If True, also write every chunk to its own JSON file.
+    seed : int, optional
+        Seed of the random number generator, for reproducible samples.
+    dtype : str
+        Floating-point type used for sampling, "float64" (default) or "float32".
+    n_jobs : int
+        Number of joblib workers drawing chunks in parallel (-1 for all cores).
+        Only used with the NumPy backend and when joblib >= 1.3 is installed;
+        every worker holds a full sampling batch in memory.
 
     Returns
     -------
@@ -100,7 +113,7 @@ def sample_max_post(
 
     # --- MAP hyperparameters ---
     # Extract the Maximum a Posteriori (MAP) parameters from a Bilby result.
-    # - Load the .hdf5 result file and copy the posterior samples.
+    # - Load the .hdf5 result file.
     # - Compute a score:
     #     * If the prior is non-uniform, use log_likelihood + log_prior (true MAP).
     #     * If the prior is uniform (constant, as in this case), log_prior adds nothing,
@@ -108,15 +121,96 @@ def sample_max_post(
     # - Select the sample that maximizes this score.
 
     # Load "Broken Power Law + 2 Peaks model" and extract MAP sample
-    hyperparams = read_in_result(hyperparams_file)
-    maxp_samp = _get_map_sample(hyperparams)
+    maxp_samp = get_map_sample(hyperparams_file)
 
     # Set minimum and maximum allowed masses for the model
     maxp_samp["absolute_mmin"] = absolute_mmin
     maxp_samp["absolute_mmax"] = absolute_mmax
     logger.info(f"[{label}] MAP hyperparameters loaded.")
 
-    # --- model (no caching) ---
+    # --- model parameters ---
+    # Plain Python floats, so that they do not promote float32 arrays to
+    # float64. The model itself is built by every chunk from these parameters,
+    # as it does not survive pickling to a joblib worker.
+    parameters = maxp_samp.to_dict()
+
+    # --- chunked sampling ---
+    # We split the total number of samples into smaller "chunks" to avoid
+    # memory overload; each chunk is appended to the HDF5 output as soon as it
+    # is drawn so that partial results are kept on disk.
+    json_file = f"{events_prefix}_all.json"
+    h5_file = f"{events_prefix}_all.h5"
+    n_chunks = int(np.ceil(n_samples / chunk_size))
+    chunk_sizes = [
+        min(chunk_size, n_samples - counter * chunk_size) for counter in range(n_chunks)
+    ]
+    logger.info(f"Sampling {n_samples} events in {n_chunks} chunks of {chunk_size}")
+
+    # Every chunk has its own random stream spawned from the seed, so the
+    # samples do not depend on the number of workers.
+    chunk_seeds = [
+        int(child.generate_state(1, np.uint64)[0])
+        for child in np.random.SeedSequence(seed).spawn(n_chunks)
+    ]
+
+    if n_jobs != 1 and (Parallel is None or xp is not np):
+        logger.warning("Parallel sampling needs joblib >= 1.3 and the NumPy backend.")
+        n_jobs = 1
+    if n_jobs == 1:
+        chunks = (
+            _draw_chunk(parameters, pairing, z_max, current_chunk, chunk_seed, dtype)
+            for current_chunk, chunk_seed in zip(chunk_sizes, chunk_seeds)
+        )
+    else:
+        # results are yielded in submission order, so the output file is
+        # written in the same order as in the serial case
+        chunks = Parallel(n_jobs=n_jobs, return_as="generator")(
+            delayed(_draw_chunk)(
+                parameters, pairing, z_max, current_chunk, chunk_seed, dtype
+            )
+            for current_chunk, chunk_seed in zip(chunk_sizes, chunk_seeds)
+        )
+
+    with h5py.File(h5_file, "w") as h5:
+        # Loop over each chunk
+        for counter, events_chunk in enumerate(
+            tqdm(chunks, total=n_chunks, desc="Simulating CBC events")
+        ):
+            if emit_chunk_json:
+                events_chunk.reset_index(drop=True).to_json(
+                    f"{events_prefix}_{counter + 1}.json", indent=2
+                )
+
+            # Append the chunk to a resizable table readable with
+            # astropy.table.Table.read(h5_file, path="events")
+            records = events_chunk.to_records(index=False)
+            if "events" not in h5:
+                h5.create_dataset(
+                    "events", shape=(0,), maxshape=(None,), dtype=records.dtype
+                )
+            dset = h5["events"]
+            dset.resize((dset.shape[0] + len(records),))
+            dset[-len(records) :] = records
+
+    # --- save global JSON output ---
+    with h5py.File(h5_file, "r") as h5:
+        events = pd.DataFrame(h5["events"][:])
+    events.to_json(json_file, indent=4)
+
+    # quick counts
+    bns_count = (events["mass_1"] < 3).sum()
+    nsbh_count = ((events["mass_2"] < 3) & (events["mass_1"] >= 3)).sum()
+    bbh_count = (events["mass_2"] >= 3).sum()
+    logger.info(f"BNS={bns_count}  NSBH={nsbh_count}  BBH={bbh_count}")
+
+    logger.info(f"Saved outputs: {json_file}, {h5_file}")
+    return {"json": str(json_file), "h5": str(h5_file)}
+
+
+def _build_model(parameters, pairing, z_max):
+    """
+    Population model (no caching) with the given hyperparameters.
+    """
     if pairing:
         components = [
             matter_matters_pairing,
@@ -134,57 +228,24 @@ def sample_max_post(
         ]
 
     model = Model(components, cache=False)
-    model.parameters.update(maxp_samp)
+    model.parameters.update(parameters)
+    return model
 
-    # rng = np.random.default_rng(seed) if seed is not None else None
 
-    # --- chunked sampling ---
-    # We split the total number of samples into smaller "chunks" to avoid
-    # memory overload and to save intermediate results to disk.
-    dfs = []
-    n_chunks = int(np.ceil(n_samples / chunk_size))
-    logger.info(f"Sampling {n_samples} events in {n_chunks} chunks of {chunk_size}")
-
-    # Loop over each chunk
-    for counter in tqdm(range(n_chunks), desc="Simulating CBC events"):
-        current_chunk = min(chunk_size, n_samples - counter * chunk_size)
-        if current_chunk <= 0:
-            break
-
-        # Generate events from the population model
-        events_chunk = draw_true_values(
-            model=model, vt_model=None, n_samples=current_chunk
-        )
-
-        # Save the current chunk immediately as JSON
-        # (this prevents memory issues and keeps partial results safe)
-        events_chunk.reset_index(drop=True).to_json(
-            f"{events_prefix}_{counter + 1}.json", indent=2
-        )
-
-        # Keep the chunk in memory for final concatenation
-        dfs.append(events_chunk)
-
-    # --- concatenate all chunks + save global outputs ---
-    # Save final outputs
-    json_file = f"{events_prefix}_all.json"
-    h5_file = f"{events_prefix}_all.h5"
-
-    events = pd.concat(dfs).reset_index(drop=True)
-    events.to_json(json_file, indent=4)
-    Table.from_pandas(events).write(
-        h5_file, path="events", overwrite=True, format="hdf5"
+def _draw_chunk(parameters, pairing, z_max, n_samples, seed, dtype):
+    """
+    Draw one chunk of events with its own model and random generator.
+    Runs in the joblib workers when sampling in parallel.
+    """
+    model = _build_model(parameters, pairing, z_max)
+    return draw_true_values(
+        model=model,
+        vt_model=None,
+        n_samples=n_samples,
+        rng=xp.random.default_rng(seed),
+        dtype=dtype,
     )
 
-    # quick counts
-    bns_count = (events["mass_1"] < 3).sum()
-    nsbh_count = ((events["mass_2"] < 3) & (events["mass_1"] >= 3)).sum()
-    bbh_count = (events["mass_2"] >= 3).sum()
-    logger.info(f"BNS={bns_count}  NSBH={nsbh_count}  BBH={bbh_count}")
-
-    logger.info(f"Saved outputs: {json_file}, {h5_file}")
-    return {"json": str(json_file), "h5": str(h5_file)}
-
 
 # ---------------- CLI ----------------
 def _parse_args(argv=None):
@@ -220,6 +281,11 @@ def _parse_args(argv=None):
         default=1_000,
         help="Chunk size for incremental writes.",
     )
+    parser.add_argument(
+        "--emit-chunk-json",
+        action="store_true",
+        help="Also write every chunk to its own JSON file.",
+    )
     parser.add_argument(
         "--absolute-mmin", type=float, default=0.5, help="Absolute min mass."
     )
@@ -229,6 +295,21 @@ def _parse_args(argv=None):
     parser.add_argument(
         "--z-max", type=float, default=2.3, help="Max redshift for PowerLawRedshift."
     )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random seed for reproducible samples."
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=["float32", "float64"],
+        default="float64",
+        help="Floating-point type used for sampling (float32 halves the memory).",
+    )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="Number of parallel workers drawing chunks (-1 for all cores).",
+    )
     return parser.parse_args(argv)
 
 
@@ -255,6 +336,10 @@ def main(argv=None):
         absolute_mmax=args.absolute_mmax,
         z_max=args.z_max,
         pairing=args.pairing,
+        emit_chunk_json=args.emit_chunk_json,
+        seed=args.seed,
+        dtype=args.dtype,
+        n_jobs=args.n_jobs,
     )
 
 
@@ -9,9 +9,7 @@ for population-level GW studies.
 
 """
 
-import numpy as np
 import pandas as pd
-from bilby.core.prior import Uniform
 from bilby.core.utils import logger
 from gwpopulation.utils import to_numpy, xp
 
@@ -28,8 +26,11 @@ BOUNDS = {
     "redshift": (0.0, 1.5),
 }
 
+# Default random number generator, used when no generator is passed explicitly
+_RNG = xp.random.default_rng()
 
-def draw_true_values(model, vt_model=None, n_samples=40):
+
+def draw_true_values(model, vt_model=None, n_samples=40, rng=None, dtype="float64"):
     """
     Draw synthetic gravitational-wave event parameters using rejection sampling from a population model.
 
@@ -42,6 +43,13 @@ def draw_true_values(model, vt_model=None, n_samples=40):
         If not provided, a flat selection function (all events equally detectable) is assumed.
     n_samples : int, optional
         Number of synthetic samples to generate. Default is 40.
+    rng : numpy.random.Generator or cupy.random.Generator, optional
+        Random number generator used for the prior draws and the rejection step.
+        Defaults to a module-level generator.
+    dtype : str or dtype, optional
+        Floating-point type of the prior draws, of the rejection step and of the
+        returned samples. Default is ``"float64"``; ``"float32"`` is ample for comparing
+        probabilities to uniform variates and halves the memory of each batch.
 
     Returns
     -------
@@ -64,56 +72,61 @@ def draw_true_values(model, vt_model=None, n_samples=40):
     else:
         raise NotImplementedError("Custom VT models are not yet implemented.")
 
-    total_samples = pd.DataFrame()
+    if rng is None:
+        rng = _RNG
+
     n_per_iteration = n_samples * 10000
 
+    # Accepted samples are stored in a single (n_columns, n_samples) block that
+    # lives on the xp device; it is only copied back to the host once sampling
+    # is complete.
+    columns = [*BOUNDS, "mass_2"]
+    samples = xp.empty((len(columns), n_samples), dtype=dtype)
+    n_accepted = 0
+    max_prob = 0.0
+
     while True:
-        data = _draw_from_prior(n_samples=n_per_iteration)
+        data = _draw_from_prior(n_samples=n_per_iteration, rng=rng, dtype=dtype)
         data["mass_2"] = data["mass_1"] * data["mass_ratio"]
-
-        print("model.prob(data).shape:", model.prob(data).shape)
+        # neutron-star masks shared by the spin models, see spin._is_neutron_star
+        data["is_ns_1"] = data["mass_1"] < 3
+        data["is_ns_2"] = data["mass_2"] < 3
 
         prob = model.prob(data) * data["mass_1"]
         prob *= vt_model(data)
-
-        data_df = pd.DataFrame({key: to_numpy(value) for key, value in data.items()})
-        data_df["prob"] = to_numpy(prob)
-        total_samples = pd.concat([total_samples, data_df], ignore_index=True)
-
-        max_prob = total_samples["prob"].max()
-        total_samples = total_samples[
-            total_samples["prob"] > max_prob / n_per_iteration
-        ]
-
-        keep = total_samples["prob"].values >= np.random.uniform(
-            0, max_prob, len(total_samples)
-        )
-
-        if keep.sum() >= n_samples:
-            total_samples = total_samples[keep].iloc[:n_samples]
+        # model components outside this package may promote to float64
+        prob = prob.astype(dtype, copy=False)
+        # NaN (e.g. log(0) at mass_2 = 0) or inf would freeze the envelope
+        # below, such draws get zero probability as with pandas' NaN-skipping max
+        prob = xp.where(xp.isfinite(prob), prob, 0)
+
+        # The rejection envelope only grows: when a larger probability shows up,
+        # thin the samples accepted so far by old/new max so that they remain
+        # distributed as prob / max_prob.
+        batch_max = float(prob.max())
+        if batch_max > max_prob:
+            if n_accepted > 0:
+                keep = batch_max * rng.random(n_accepted, dtype=dtype) < max_prob
+                n_kept = int(keep.sum())
+                samples[:, :n_kept] = samples[:, :n_accepted][:, keep]
+                n_accepted = n_kept
+            max_prob = batch_max
+
+        keep = prob > max_prob * rng.random(prob.size, dtype=dtype)
+        keep = xp.flatnonzero(keep)[: n_samples - n_accepted]
+        for row, key in zip(samples, columns):
+            row[n_accepted : n_accepted + keep.size] = data[key][keep]
+        n_accepted += int(keep.size)
+
+        if n_accepted >= n_samples:
             break
 
-        logger.info(
-            f"Sampling efficiency low. Total samples so far: {len(total_samples)}"
-        )
+        logger.info(f"Sampling efficiency low. Accepted samples so far: {n_accepted}")
 
-        model.prob(
-            {
-                "mass_1": xp.array([5, 9]),
-                "mass_2": xp.array([1, 5]),
-                "a_1": xp.array([0.5, 0.6]),
-                "a_2": xp.array([0.5, 0.6]),
-                "cos_tilt_1": xp.array([0.1, 0.1]),
-                "cos_tilt_2": xp.array([0.1, 0.1]),
-                "redshift": xp.array([0.6, 0.6]),
-            }
-        )
+    return pd.DataFrame(to_numpy(samples).T, columns=columns)
 
-    total_samples = total_samples.drop(columns="prob")
-    return total_samples
 
-
-def _draw_from_prior(n_samples):
+def _draw_from_prior(n_samples, rng, dtype="float64"):
     """
     Draws samples uniformly from prior bounds for each parameter.
 
@@ -121,24 +134,21 @@ def _draw_from_prior(n_samples):
     ----------
     n_samples : int
         Number of samples to draw.
-
+    rng : numpy.random.Generator or cupy.random.Generator
+        Random number generator to draw from.
+    dtype : str or dtype, optional
+        Floating-point type of the samples. Default is ``"float64"``.
 
     Returns
     -------
     dict
-        Dictionary containing arrays of sampled parameters.
+        Dictionary containing arrays of sampled parameters, as rows of a single
+        contiguous array.
     """
-    samples = {
-        key: xp.random.uniform(low, high, n_samples)
-        for key, (low, high) in BOUNDS.items()
-    }
-
-    samples["redshift"] = xp.asarray(
-        Uniform(
-            minimum=BOUNDS["redshift"][0],
-            maximum=BOUNDS["redshift"][1],
-            name="redshift",
-        ).sample(n_samples)
-    )
-
-    return samples
+    # One contiguous (n_parameters, n_samples) block, each parameter is a row
+    # view into it.
+    low, high = xp.asarray(list(BOUNDS.values()), dtype=dtype).T
+    block = rng.random((len(BOUNDS), n_samples), dtype=dtype)
+    block *= (high - low)[:, None]
+    block += low[:, None]
+    return dict(zip(BOUNDS, block))
@@ -3,7 +3,12 @@ Spin population models for gravitational-wave sources from "https://github.com/C
 Provides functions for evaluating spin orientation and spin magnitude distributions.
 """
 
-from gwpopulation.utils import beta_dist, truncnorm, xp
+from operator import gt
+
+import numpy as np
+from gwpopulation.utils import apply_conditions, beta_dist, truncnorm, xp
+
+from ._truncnorm import log_truncnorm_norm
 
 
 def iid_spin_orientation_gaussian_isotropic(dataset, xi_spin, sigma_spin):
@@ -109,8 +114,8 @@ def independent_spin_magnitude_beta(
         return 0
 
     # Restrict spins for neutron stars (mass < 3 M_sun)
-    amax_1 = xp.where(dataset["mass_1"] < 3, 0.4, amax_1)
-    amax_2 = xp.where(dataset["mass_2"] < 3, 0.4, amax_2)
+    amax_1 = _neutron_star_amax(_is_neutron_star(dataset, 1), amax_1)
+    amax_2 = _neutron_star_amax(_is_neutron_star(dataset, 2), amax_2)
 
     prior = beta_dist(
         dataset["a_1"], alpha_chi_1, beta_chi_1, scale=amax_1
@@ -142,13 +147,19 @@ def independent_spin_magnitude_gaussian(
     amax_2: float
         Maximum spin magnitude for the secondary black holes.
     """
-    amax_1 = xp.where(dataset["mass_1"] < 3, 0.4, amax_1)
-    amax_2 = xp.where(dataset["mass_2"] < 3, 0.4, amax_2)
-    p_a_1 = truncnorm(
-        dataset["a_1"], mu=mu_chi_1, sigma=sigma_chi_1, high=amax_1, low=0
+    p_a_1 = _spin_magnitude_truncnorm(
+        dataset["a_1"],
+        _is_neutron_star(dataset, 1),
+        mu=mu_chi_1,
+        sigma=sigma_chi_1,
+        amax=amax_1,
     )
-    p_a_2 = truncnorm(
-        dataset["a_2"], mu=mu_chi_2, sigma=sigma_chi_2, high=amax_2, low=0
+    p_a_2 = _spin_magnitude_truncnorm(
+        dataset["a_2"],
+        _is_neutron_star(dataset, 2),
+        mu=mu_chi_2,
+        sigma=sigma_chi_2,
+        amax=amax_2,
     )
     return p_a_1 * p_a_2
 
@@ -172,3 +183,48 @@ def iid_spin_magnitude_gaussian(dataset, mu_chi, sigma_chi, amax):
         dataset, mu_chi, mu_chi, sigma_chi, sigma_chi, amax, amax
     )
     return prior
+
+
+def _is_neutron_star(dataset, index):
+    """
+    Mask of the neutron stars (mass < 3 M_sun) for component ``index`` (1 or 2).
+    Uses the precomputed ``is_ns_<index>`` entry of the dataset when present.
+    """
+    key = f"is_ns_{index}"
+    if key in dataset:
+        return dataset[key]
+    return dataset[f"mass_{index}"] < 3
+
+
+def _neutron_star_amax(is_ns, amax):
+    """
+    Maximum spin, 0.4 for neutron stars and ``amax`` otherwise.
+    Written as a multiply-add on the mask rather than ``xp.where(is_ns, 0.4, amax)``.
+    """
+    return amax + (0.4 - amax) * is_ns
+
+
+@apply_conditions(dict(sigma=(gt, 0)))
+def _spin_magnitude_truncnorm(spin, is_ns, mu, sigma, amax):
+    """
+    Truncated normal on [0, 0.4] for neutron stars and on [0, amax] for black holes.
+    Equivalent to ``truncnorm(spin, mu, sigma, high=xp.where(is_ns, 0.4, amax), low=0)``,
+    but the normalisation only depends on the two scalar bounds, so it is computed
+    once per group instead of once per element.
+
+    As for ``truncnorm``, ``sigma`` is only checked when passed by keyword and
+    the backend is not JAX.
+    """
+    high = _neutron_star_amax(is_ns, amax)
+    log_norm = xp.where(
+        is_ns,
+        log_truncnorm_norm(mu, sigma, 0, 0.4),
+        log_truncnorm_norm(mu, sigma, 0, amax),
+    )
+    log_pdf = (
+        -(((spin - mu) / sigma) ** 2) / 2
+        - np.log(2 * np.pi) / 2
+        - xp.log(sigma)
+        - log_norm
+    )
+    return xp.nan_to_num(xp.exp(log_pdf)) * (spin >= 0) * (spin <= high)
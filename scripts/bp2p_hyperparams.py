@@ -1,19 +1,4 @@
-import numpy as np
-import pandas as pd
-from bilby.core.result import read_in_result
-
-
-def _get_map_sample(hyperparams) -> pd.Series:
-    """
-    Return MAP sample if prior is informative, else ML sample.
-    """
-    post = hyperparams.posterior.copy()
-    if "log_prior" in post and post["log_prior"].nunique() > 1:
-        score = post.log_likelihood + post.log_prior
-        return post.iloc[np.argmax(score)]
-    else:
-        return post.iloc[np.argmax(post.log_likelihood)]
-
+from cbc_population_distributions.hyperparams_io import get_map_sample
 
 hyperparams_file = (
     "../data/"
@@ -22,6 +7,12 @@ hyperparams_file = (
     "iid_spin_orientation_result.hdf5"
 )
 
-# Load "Broken Power Law + 2 Peaks" model and extract MAP sample
-hyperparams = read_in_result(hyperparams_file)
-maxp_samp = _get_map_sample(hyperparams)
+
+def main():
+    # Load "Broken Power Law + 2 Peaks" model and extract MAP sample
+    maxp_samp = get_map_sample(hyperparams_file)
+    print(maxp_samp)
+
+
+if __name__ == "__main__":
+    main()
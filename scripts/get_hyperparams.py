@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
-from bilby.core.result import read_in_result
+
+from cbc_population_distributions.hyperparams_io import get_map_sample
 
 # # in ".rst" format
 # def to_rst(df, title="Hyperparameters of the BP2P model"):
@@ -41,22 +42,19 @@ from bilby.core.result import read_in_result
 #         lines.append(hline())
 #     return "\n".join(lines)
 def to_rst(df, title="Hyperparameters of the BP2P model"):
-    widths = [max(len(str(x)) for x in df[col]) for col in df.columns]
-    widths = [max(w, len(col)) for w, col in zip(widths, df.columns)]
+    # header and cells in one string array, every column padded to its width
+    cells = np.vstack([df.columns.to_numpy(dtype=str), df.to_numpy(dtype=str)])
+    widths = np.char.str_len(cells).max(axis=0)
+    header, *rows = ["| " + " | ".join(r) + " |" for r in np.char.ljust(cells, widths)]
 
     def hline(sep="-"):
         return "+" + "+".join(sep * (w + 2) for w in widths) + "+"
 
-    def row(cells):
-        return (
-            "|" + "|".join(f" {str(c).ljust(w)} " for c, w in zip(cells, widths)) + "|"
-        )
-
     # build the grid table body (no directive yet)
-    body = [hline("-"), row(df.columns), hline("=")]
-    for _, r in df.iterrows():
-        body.append(row(r))
-        body.append(hline())
+    separator = hline()
+    body = [hline("-"), header, hline("=")]
+    for r in rows:
+        body.extend((r, separator))
 
     # indent body so it belongs to the table directive
     indented = ["   " + line for line in body]  # 3 spaces is conventional
@@ -76,26 +74,21 @@ def to_latex(df, caption="Hyperparameters of the BP2P model"):
     out.append(r"\hline")
     out.append(r"Parameter & Description & Value\\")
     out.append(r"\hline")
-    for _, row in df.iterrows():
-        out.append(rf"{row['Parameter']} & {row['Description']} & {row['Value']} \\")
+    rows = (
+        df["Parameter"].astype(str)
+        + " & "
+        + df["Description"].astype(str)
+        + " & "
+        + df["Value"].astype(str)
+        + r" \\"
+    )
+    out.extend(rows.tolist())
     out.append(r"\hline")
     out.append(r"\end{tabular}")
     out.append(r"\end{table}")
     return "\n".join(out)
 
 
-def _get_map_sample(hyperparams) -> pd.Series:
-    """
-    Return MAP sample if prior is informative, else ML sample.
-    """
-    post = hyperparams.posterior.copy()
-    if "log_prior" in post and post["log_prior"].nunique() > 1:
-        score = post.log_likelihood + post.log_prior
-        return post.iloc[np.argmax(score)]
-    else:
-        return post.iloc[np.argmax(post.log_likelihood)]
-
-
 PARAMS_INFO = {
     "alpha_1": (r"\alpha_1", "Power-law exponent below $\\gamma_{low1}$"),
     "alpha_2": (r"\alpha_2", "Power-law exponent above $\\gamma_{high1}$"),
@@ -145,24 +138,43 @@ PARAMS_INFO = {
 }
 
 
+# "Parameter" (math-mode symbol) and "Description" columns of the table for
+# every known parameter, indexed by posterior key; built once at import
+PARAMS_TABLE = pd.DataFrame.from_dict(
+    PARAMS_INFO, orient="index", columns=["Parameter", "Description"]
+)
+PARAMS_TABLE["Parameter"] = "$" + PARAMS_TABLE["Parameter"] + "$"
+
+
 hyperparams_file = "../data/baseline5_widesigmachi2_mass_NotchFilterBinnedPairingMassDistribution_redshift_powerlaw_mag_iid_spin_magnitude_gaussian_tilt_iid_spin_orientation_result.hdf5"
 
-# Load "Broken Power Law + 2 Peaks model" and extract MAP sample
-hyperparams = read_in_result(hyperparams_file)
-maxp_samp = _get_map_sample(hyperparams)
 
+def main():
+    # Load "Broken Power Law + 2 Peaks model" and extract MAP sample
+    maxp_samp = get_map_sample(hyperparams_file, columns=PARAMS_INFO)
+
+    # one index lookup for all the parameters present in the MAP sample
+    present = PARAMS_TABLE.index.intersection(maxp_samp.index, sort=False)
+    selected = PARAMS_TABLE.loc[present]
+
+    # built in one go from aligned, already typed arrays
+    df = pd.DataFrame(
+        {
+            "Parameter": selected["Parameter"].to_numpy(),
+            "Description": selected["Description"].to_numpy(),
+            "Value": np.char.mod(
+                "%.3g", maxp_samp.loc[present].to_numpy(dtype=float)
+            ),
+        }
+    )
 
-rows = []
-for key, (param, desc) in PARAMS_INFO.items():
-    if key in maxp_samp:
-        val = maxp_samp[key]
-        rows.append((f"${param}$", desc, f"{val:.3g}"))
+    # Sauvegarde
+    with open("hyperparams_table.rst", "w") as f:
+        f.write(to_rst(df))
 
-df = pd.DataFrame(rows, columns=["Parameter", "Description", "Value"])
+    with open("hyperparams_table.tex", "w") as f:
+        f.write(to_latex(df))
 
-# Sauvegarde
-with open("hyperparams_table.rst", "w") as f:
-    f.write(to_rst(df))
 
-with open("hyperparams_table.tex", "w") as f:
-    f.write(to_latex(df))
+if __name__ == "__main__":
+    main()
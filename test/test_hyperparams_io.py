@@ -0,0 +1,214 @@
+import os
+import subprocess
+import sys
+
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+from cbc_population_distributions import hyperparams_io
+from cbc_population_distributions.hyperparams_io import (
+    _argmax_sum,
+    _get_map_sample,
+    get_map_sample,
+)
+
+
+class DummyResult:
+    def __init__(self, posterior):
+        self.posterior = posterior
+
+
+class DummyPosterior:
+    """
+    The part of the DataFrame interface used by _get_map_sample, on plain
+    NumPy arrays, so tests do not pay for building a DataFrame.
+    """
+
+    def __init__(self, **columns):
+        self._columns = {key: np.asarray(value) for key, value in columns.items()}
+        self.columns = list(self._columns)
+        self.iloc = _RowIndexer(self._columns)
+
+    def __getitem__(self, key):
+        return _Column(self._columns[key])
+
+
+class _Column:
+    def __init__(self, values):
+        self._values = values
+
+    def to_numpy(self):
+        return self._values
+
+
+class _RowIndexer:
+    def __init__(self, columns):
+        self._columns = columns
+
+    def __getitem__(self, i):
+        return {key: value[i] for key, value in self._columns.items()}
+
+
+def test_get_map_sample_ml():
+    # Prior constant -> should select ML
+    post = DummyPosterior(log_likelihood=[0.1, 2.0, 1.0], log_prior=[0.0, 0.0, 0.0])
+    sample = _get_map_sample(DummyResult(post))
+    assert sample["log_likelihood"] == 2.0
+
+
+def test_get_map_sample_map():
+    # Prior informative -> should select MAP (ll + lp)
+    post = DummyPosterior(log_likelihood=[1.0, 1.0, 1.0], log_prior=[0.1, 5.0, 0.2])
+    sample = _get_map_sample(DummyResult(post))
+    assert sample["log_prior"] == 5.0
+
+
+def test_get_map_sample_skips_nan():
+    # NaN rows are never the MAP (or ML) sample, as with the pandas argmax
+    post = DummyPosterior(log_likelihood=[1.0, np.nan, 3.0], row=[0, 1, 2])
+    assert _get_map_sample(DummyResult(post))["row"] == 2
+
+    post = DummyPosterior(
+        log_likelihood=[1.0, 1.0, 1.0, 0.0],
+        log_prior=[0.0, 5.0, np.nan, 2.0],
+        row=[0, 1, 2, 3],
+    )
+    assert _get_map_sample(DummyResult(post))["row"] == 1
+
+    post = DummyPosterior(
+        log_likelihood=[1.0, np.nan, 0.0], log_prior=[0.0, 5.0, 2.0], row=[0, 1, 2]
+    )
+    assert _get_map_sample(DummyResult(post))["row"] == 2
+
+
+def test_get_map_sample_nan_prior_is_constant():
+    # NaN does not make a constant prior informative, nor does an all-NaN one
+    for log_prior in ([0.0, np.nan, 0.0], [np.nan, np.nan, np.nan]):
+        post = DummyPosterior(
+            log_likelihood=[1.0, 0.0, 3.0], log_prior=log_prior, row=[0, 1, 2]
+        )
+        assert _get_map_sample(DummyResult(post))["row"] == 2
+
+
+def test_get_map_sample_large():
+    # MAP is not the ML sample, and ties resolve to the first maximum
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    log_likelihood = rng.normal(size=n)
+    log_prior = rng.normal(size=n)
+    log_likelihood[[10, 20]] = 10.0
+    log_prior[[10, 20]] = 10.0
+    log_likelihood[30] = 15.0
+    post = DummyPosterior(
+        log_likelihood=log_likelihood, log_prior=log_prior, row=np.arange(n)
+    )
+    sample = _get_map_sample(DummyResult(post))
+    assert sample["row"] == 10
+
+
+@pytest.mark.parametrize("n_threads", [1, 3, 8])
+def test_fused_argmax_matches_numpy(monkeypatch, n_threads):
+    # The fused kernel only runs on very large posteriors: lower the threshold
+    # and fake the thread count to exercise the block reduction
+    kernels = pytest.importorskip("cbc_population_distributions._argmax_kernels")
+    monkeypatch.setattr(hyperparams_io, "_FUSED_ARGMAX_MIN_SIZE", 0)
+    monkeypatch.setattr(kernels, "get_num_threads", lambda: n_threads)
+    rng = np.random.default_rng(0)
+    cases = [
+        # ties across blocks resolve to the first maximum
+        (np.zeros(50), np.zeros(50)),
+        (np.r_[np.zeros(20), 1.0, np.zeros(20), 1.0], np.zeros(42)),
+        # NaN sums are skipped, also when they fill whole blocks
+        (np.r_[rng.normal(size=30), np.nan, 5.0, np.nan], np.zeros(33)),
+        (np.r_[9.0, rng.normal(size=30)], np.r_[np.zeros(29), np.nan, 0.0]),
+        (np.r_[np.full(20, np.nan), rng.normal(size=10)], np.zeros(30)),
+        (np.r_[np.full(5, np.nan), -np.inf, -np.inf], np.zeros(7)),
+        (rng.normal(size=1000), rng.normal(size=1000)),
+        (np.ones(2), np.ones(2)),
+    ]
+    with np.errstate(invalid="ignore"):
+        for a, b in cases:
+            assert _argmax_sum(a, b) == np.nanargmax(a + b)
+        with pytest.raises(ValueError, match="All-NaN"):
+            _argmax_sum(np.full(10, np.nan), np.zeros(10))
+
+
+def test_get_map_sample_dataframe():
+    # The production path: a real posterior DataFrame returns a Series row
+    df = pd.DataFrame({"log_likelihood": [0.1, 2.0], "log_prior": [0.0, 1.0]})
+    sample = _get_map_sample(DummyResult(df))
+    assert isinstance(sample, pd.Series)
+    assert sample.name == 1
+
+
+def test_get_map_sample_copy():
+    # Modifying the returned sample must not modify the posterior
+    df = pd.DataFrame({"log_likelihood": [0.1, 2.0], "log_prior": [0.0, 1.0]})
+    res = DummyResult(df)
+    first = _get_map_sample(res)
+    first["log_likelihood"] = -1.0
+    assert _get_map_sample(res)["log_likelihood"] == 2.0
+
+
+def _write_result(path, mtime_ns, **posterior):
+    # the layout of bilby HDF5 results: one dataset per posterior column
+    with h5py.File(path, "w") as f:
+        group = f.create_group("posterior")
+        for key, value in posterior.items():
+            group.create_dataset(key, data=value)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_get_map_sample_hdf5(tmp_path):
+    path = tmp_path / "result.hdf5"
+    _write_result(
+        path,
+        1_000_000_000,
+        log_likelihood=[0.0, 1.0, 2.0],
+        log_prior=[0.0, 2.0, 0.0],
+        alpha=[10.0, 11.0, 12.0],
+        beta=[20.0, 21.0, 22.0],
+    )
+    sample = get_map_sample(path)
+    assert set(sample.index) == {"log_likelihood", "log_prior", "alpha", "beta"}
+    assert sample["alpha"] == 11.0
+
+    # only the requested columns are read, missing ones are skipped
+    sample = get_map_sample(path, columns=["beta", "gamma"])
+    assert set(sample.index) == {"log_likelihood", "log_prior", "beta"}
+    assert sample["beta"] == 21.0
+
+    # a rewritten file is read again
+    _write_result(
+        path,
+        2_000_000_000,
+        log_likelihood=[5.0, 1.0, 2.0],
+        log_prior=[0.0, 2.0, 0.0],
+        alpha=[10.0, 11.0, 12.0],
+        beta=[20.0, 21.0, 22.0],
+    )
+    assert get_map_sample(path, columns=["beta"])["beta"] == 20.0
+
+
+def test_get_map_sample_not_a_result(tmp_path):
+    text = tmp_path / "result.json"
+    text.write_text("{}")
+    with pytest.raises(ValueError, match="Not an HDF5 file"):
+        get_map_sample(text)
+
+    path = tmp_path / "result.hdf5"
+    with h5py.File(path, "w") as f:
+        f.create_dataset("posterior", data=np.zeros((3, 2)))
+    with pytest.raises(ValueError, match="not a bilby HDF5 result"):
+        get_map_sample(path)
+
+
+def test_hyperparams_io_does_not_import_bilby():
+    # reading hyperparameters (scripts, tests) must not pay the bilby import
+    code = (
+        "import sys, cbc_population_distributions.hyperparams_io; "
+        "sys.exit('bilby' in sys.modules)"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+from gwpopulation.utils import truncnorm
+
+from cbc_population_distributions import mass
+from cbc_population_distributions.mass import (
+    matter_matters_pairing,
+    matter_matters_primary_secondary_independent,
+    power_law_dip_break_1d,
+)
+
+PARAMETERS = dict(
+    A=0.9,
+    A2=0.5,
+    NSmin=1.1,
+    NSmax=2.3,
+    BHmin=5.5,
+    BHmax=80.0,
+    UPPERmin=40.0,
+    UPPERmax=60.0,
+    n0=50.0,
+    n1=40.0,
+    n2=30.0,
+    n3=20.0,
+    n4=10.0,
+    n5=5.0,
+    alpha_1=-1.5,
+    alpha_2=-3.2,
+    alpha_dip=1.2,
+    mu1=35.0,
+    sig1=4.0,
+    mix1=0.3,
+    mu2=9.0,
+    sig2=1.5,
+    mix2=0.6,
+    absolute_mmin=0.5,
+    absolute_mmax=350.0,
+)
+PAIRING = dict(mbreak=5.0, beta_pair_1=1.5, beta_pair_2=3.0)
+
+
+def _reference_power_law_dip_break_1d(
+    mass,
+    A,
+    A2,
+    NSmin,
+    NSmax,
+    BHmin,
+    BHmax,
+    UPPERmin,
+    UPPERmax,
+    n0,
+    n1,
+    n2,
+    n3,
+    n4,
+    n5,
+    alpha_1,
+    alpha_2,
+    alpha_dip,
+    mu1,
+    sig1,
+    mix1,
+    mu2,
+    sig2,
+    mix2,
+    absolute_mmin,
+    absolute_mmax,
+):
+    # the original, unoptimised implementation of power_law_dip_break_1d
+    gaussian_peak1 = truncnorm(mass, mu1, sig1, low=absolute_mmin, high=absolute_mmax)
+    gaussian_peak2 = truncnorm(mass, mu2, sig2, low=absolute_mmin, high=absolute_mmax)
+
+    condlist = [mass < NSmax, (mass >= NSmax) & (mass < BHmin), mass >= BHmin]
+    choicelist = [
+        mass**alpha_1,
+        (mass**alpha_dip) * (NSmax ** (alpha_1 - alpha_dip)),
+        (mass**alpha_2)
+        * (NSmax ** (alpha_1 - alpha_dip))
+        * (BHmin ** (alpha_dip - alpha_2)),
+    ]
+    plaw = np.select(condlist, choicelist, default=0.0)
+
+    highpass_lower = 1 + (NSmin / mass) ** n0
+    notch_lower = 1.0 - A / ((1 + (NSmax / mass) ** n1) * (1 + (mass / BHmin) ** n2))
+    notch_upper = 1.0 - A2 / (
+        (1 + (UPPERmin / mass) ** n3) * (1 + (mass / UPPERmax) ** n4)
+    )
+    lowpass_upper = 1 + (mass / BHmax) ** n5
+
+    return (
+        (1 + mix1 * gaussian_peak1 + mix2 * gaussian_peak2)
+        * plaw
+        * notch_lower
+        * notch_upper
+        / highpass_lower
+        / lowpass_upper
+    )
+
+
+def _dataset(n=100_000):
+    rng = np.random.default_rng(0)
+    mass_1 = rng.uniform(0.1, 400, n)
+    # both m1 >= m2 (as drawn by the sampler) and m1 < m2 pairs
+    mass_2 = np.r_[mass_1[: n // 2] * rng.uniform(0, 1, n // 2), mass_1[n // 2 :][::-1]]
+    return dict(mass_1=mass_1, mass_2=mass_2)
+
+
+@pytest.fixture(params=["numba", "xp"])
+def backend(request, monkeypatch):
+    if request.param == "numba":
+        pytest.importorskip("numba")
+    else:
+        monkeypatch.setattr(mass, "njit", None)
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "peaks",
+    [
+        {},
+        # peaks far outside [absolute_mmin, absolute_mmax]
+        dict(mu1=1000.0, sig1=5.0, mu2=-300.0, sig2=2.0),
+    ],
+)
+def test_power_law_dip_break_1d_matches_reference(backend, peaks):
+    parameters = dict(PARAMETERS, **peaks)
+    masses = _dataset()["mass_1"]
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        expected = _reference_power_law_dip_break_1d(masses, **parameters)
+        result = power_law_dip_break_1d(masses, **parameters)
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result, expected, rtol=1e-10, atol=0)
+
+
+@pytest.mark.parametrize(
+    "model, parameters",
+    [
+        (matter_matters_primary_secondary_independent, PARAMETERS),
+        (matter_matters_pairing, dict(PARAMETERS, **PAIRING)),
+    ],
+)
+def test_fused_kernel_matches_xp_path(monkeypatch, model, parameters):
+    pytest.importorskip("numba")
+    dataset = _dataset()
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        fused = model(dataset, **parameters)
+        monkeypatch.setattr(mass, "njit", None)
+        array = model(dataset, **parameters)
+    np.testing.assert_allclose(fused, array, rtol=1e-10, atol=0)
+    assert (fused[dataset["mass_1"] < dataset["mass_2"]] == 0).all()
@@ -1,34 +1,81 @@
-import pandas as pd
+import numpy as np
+import pytest
+from astropy.table import Table
+from test_hyperparams_io import _write_result
 
-from cbc_population_distributions.population_driver import _get_map_sample
+from cbc_population_distributions import population_driver
+from cbc_population_distributions.population_driver import sample_max_post
 
+# MAP hyperparameters of the GWTC-4 Broken Power Law + Two Peaks result
+MAP_HYPERPARAMETERS = dict(
+    A=0.09146,
+    A2=0.8282,
+    BHmax=152.1,
+    BHmin=7.764,
+    NSmax=4.095,
+    NSmin=1.176,
+    UPPERmax=66.58,
+    UPPERmin=38.28,
+    alpha_1=-4.509,
+    alpha_2=-0.902,
+    alpha_dip=-1.68,
+    amax=1.0,
+    beta_pair_1=0.9641,
+    beta_pair_2=2.16,
+    lamb=2.407,
+    mbreak=5.0,
+    mix1=735.5,
+    mix2=211.7,
+    mu1=37.81,
+    mu2=8.898,
+    mu_chi=0.01375,
+    n0=50.0,
+    n1=50.0,
+    n2=50.0,
+    n3=30.0,
+    n4=30.0,
+    n5=10.04,
+    sig1=17.13,
+    sig2=1.045,
+    sigma_chi=0.3072,
+    sigma_spin=0.5603,
+    xi_spin=0.7129,
+)
 
-class DummyResult:
-    def __init__(self, posterior):
-        self.posterior = posterior
 
-
-def test_get_map_sample_ml():
-    # Prior constant -> should select ML
-    df = pd.DataFrame(
-        {
-            "log_likelihood": [0.1, 2.0, 1.0],
-            "log_prior": [0.0, 0.0, 0.0],
-        }
+@pytest.fixture
+def hyperparams_file(tmp_path):
+    # a two-sample posterior whose second sample is the MAP one
+    posterior = {key: [value / 2, value] for key, value in MAP_HYPERPARAMETERS.items()}
+    path = tmp_path / "result.hdf5"
+    _write_result(
+        path,
+        1_000_000_000,
+        log_likelihood=[0.0, 1.0],
+        log_prior=[0.0, 0.0],
+        **posterior,
     )
-    res = DummyResult(df)
-    sample = _get_map_sample(res)
-    assert sample["log_likelihood"] == 2.0
+    return path
 
 
-def test_get_map_sample_map():
-    # Prior informative -> should select MAP (ll + lp)
-    df = pd.DataFrame(
-        {
-            "log_likelihood": [1.0, 1.0, 1.0],
-            "log_prior": [0.1, 5.0, 0.2],
-        }
-    )
-    res = DummyResult(df)
-    sample = _get_map_sample(res)
-    assert sample["log_prior"] == 5.0
+def test_sample_max_post_n_jobs(tmp_path, hyperparams_file):
+    if population_driver.Parallel is None:
+        pytest.skip("parallel sampling needs joblib >= 1.3")
+    outputs = {
+        n_jobs: sample_max_post(
+            str(hyperparams_file),
+            outdir=str(tmp_path / f"jobs_{n_jobs}"),
+            n_samples=25,
+            chunk_size=10,
+            seed=42,
+            n_jobs=n_jobs,
+        )
+        for n_jobs in (1, 2)
+    }
+    serial = Table.read(outputs[1]["h5"], path="events")
+    parallel = Table.read(outputs[2]["h5"], path="events")
+    assert len(serial) == 25
+    assert serial.colnames == parallel.colnames
+    for name in serial.colnames:
+        np.testing.assert_array_equal(serial[name], parallel[name])
+    assert (serial["mass_2"] <= serial["mass_1"]).all()
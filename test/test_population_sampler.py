@@ -0,0 +1,84 @@
+import numpy as np
+
+from cbc_population_distributions import population_sampler
+from cbc_population_distributions.population_sampler import draw_true_values
+
+
+class DummyModel:
+    def __init__(self, nan_rows=(0,)):
+        self.nan_rows = list(nan_rows)
+
+    def prob(self, data):
+        prob = np.exp(-data["mass_1"])
+        prob[self.nan_rows] = np.nan
+        return prob
+
+
+def test_draw_true_values_nan_prob():
+    # A NaN probability in the first batch must not disable the rejection step
+    samples = draw_true_values(
+        DummyModel(), n_samples=200, rng=np.random.default_rng(0)
+    )
+    assert len(samples) == 200
+    # m1 exp(-m1) on [1, 100] has a median ~2.7, the uniform prior ~50
+    assert samples["mass_1"].median() < 5
+
+
+class LogMassModel:
+    # log(mass_2) / log(mass_2) is NaN at mass_2 = 0, as in the mass models
+    def prob(self, data):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_m2 = np.log(data["mass_2"])
+            return np.exp(-data["mass_1"]) * log_m2 / log_m2
+
+
+def test_draw_true_values_float32(monkeypatch):
+    # float32 uniforms hit exactly 0 every ~1.7e7 draws: force a zero mass ratio
+    # into every batch
+    draw_from_prior = population_sampler._draw_from_prior
+
+    def draw_with_zero_mass_ratio(n_samples, rng, dtype="float64"):
+        data = draw_from_prior(n_samples, rng, dtype=dtype)
+        data["mass_ratio"][:10] = 0
+        data["mass_1"][:10] = 1
+        return data
+
+    monkeypatch.setattr(
+        population_sampler, "_draw_from_prior", draw_with_zero_mass_ratio
+    )
+    samples = draw_true_values(
+        LogMassModel(), n_samples=200, rng=np.random.default_rng(0), dtype="float32"
+    )
+    assert (samples.dtypes == np.float32).all()
+    assert (samples["mass_ratio"] > 0).all()
+    assert samples["mass_1"].median() < 5
+
+
+class SpikeModel:
+    # prob / mass_1 is 1, or 1000 on a narrow spike a_1 > 0.999 holding half
+    # of the probability mass
+    def prob(self, data):
+        return np.where(data["a_1"] > 0.999, 1000.0, 1.0) / data["mass_1"]
+
+
+def test_draw_true_values_raised_envelope(monkeypatch):
+    # The first batch misses the spike, so its acceptances are made under a
+    # too low envelope and must be thinned when the spike shows up
+    draw_from_prior = population_sampler._draw_from_prior
+    n_calls = []
+
+    def draw_spike_later(n_samples, rng, dtype="float64"):
+        n_calls.append(n_samples)
+        if len(n_calls) > 1:
+            return draw_from_prior(n_samples, rng, dtype=dtype)
+        data = draw_from_prior(100, rng, dtype=dtype)
+        data["a_1"] *= 0.999
+        return data
+
+    monkeypatch.setattr(population_sampler, "_draw_from_prior", draw_spike_later)
+    samples = draw_true_values(
+        SpikeModel(), n_samples=200, rng=np.random.default_rng(0)
+    )
+    assert len(n_calls) > 1
+    # 0.5 if the first batch is thinned, ~0.25 if it is kept
+    assert 0.4 < (samples["a_1"] > 0.999).mean() < 0.6
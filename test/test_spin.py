@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from gwpopulation.utils import truncnorm
+
+from cbc_population_distributions.spin import independent_spin_magnitude_gaussian
+
+
+def _dataset(with_masks):
+    rng = np.random.default_rng(0)
+    n = 10_000
+    dataset = dict(
+        # spins outside [0, 1] and between 0.4 and amax check the bounds
+        a_1=rng.uniform(-0.2, 1.2, n),
+        a_2=rng.uniform(-0.2, 1.2, n),
+        mass_1=rng.uniform(1, 10, n),
+        mass_2=rng.uniform(1, 10, n),
+    )
+    if with_masks:
+        # as precomputed by the sampler
+        dataset["is_ns_1"] = dataset["mass_1"] < 3
+        dataset["is_ns_2"] = dataset["mass_2"] < 3
+    return dataset
+
+
+def _reference(dataset, mu_1, mu_2, sigma_1, sigma_2, amax_1, amax_2):
+    # the original model: truncnorm with per-element bounds
+    prob = 1
+    for i, mu, sigma, amax in ((1, mu_1, sigma_1, amax_1), (2, mu_2, sigma_2, amax_2)):
+        high = np.where(dataset[f"mass_{i}"] < 3, 0.4, amax)
+        prob = prob * truncnorm(dataset[f"a_{i}"], mu=mu, sigma=sigma, high=high, low=0)
+    return prob
+
+
+@pytest.mark.parametrize("with_masks", [True, False])
+@pytest.mark.parametrize(
+    "mu_1, mu_2, sigma_1, sigma_2, amax_1, amax_2",
+    [
+        (0.1, 0.2, 0.2, 0.1, 0.9, 0.8),
+        # peaks far above and far below [0, amax]
+        (5.0, -3.0, 0.01, 0.05, 0.8, 1.0),
+        # narrow peak between the neutron-star and black-hole maxima
+        (0.3, 0.3, 1e-3, 1e-3, 0.35, 0.35),
+    ],
+)
+def test_spin_magnitude_gaussian_matches_truncnorm(
+    with_masks, mu_1, mu_2, sigma_1, sigma_2, amax_1, amax_2
+):
+    dataset = _dataset(with_masks)
+    parameters = (mu_1, mu_2, sigma_1, sigma_2, amax_1, amax_2)
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        expected = _reference(dataset, *parameters)
+        result = independent_spin_magnitude_gaussian(dataset, *parameters)
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=0)
+
+
+def test_spin_magnitude_gaussian_sigma():
+    with pytest.raises(ValueError, match="sigma"):
+        independent_spin_magnitude_gaussian(_dataset(True), 0.1, 0.1, 0.0, 0.1, 1, 1)